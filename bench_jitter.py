@@ -0,0 +1,147 @@
+# bench_jitter.py
+# Input-path jitter benchmark under synthetic telemetry / logging load.
+# Compares the classic single-process layout (input thread + load threads
+# sharing one GIL) against MULTIPROCESS_ENABLED (input loop in its own
+# process, handing records over through a ShmRing).
+#
+# No Arduino, game or ViGEm needed:
+#   python bench_jitter.py --seconds 5 --rate 500 --load-threads 2
+
+from __future__ import annotations
+from typing import List
+from shm_ring import ShmRing
+from rt_input import apply_rt_scheduling, parse_input_line, steer_to_axis
+from telemetry_sources import F1TelemetryReader
+import argparse
+import io
+import multiprocessing as mp
+import os
+import struct
+import threading
+import time
+
+SAMPLE_LINE = "12.5-200-30-0-1-0-0-0-0-0-0-0-0-0-0-0-0-0-117-133"
+LATENESS_RECORD = struct.Struct("<d")
+
+
+# =========================
+# Synthetic workloads
+# =========================
+def input_tick() -> int:
+    """The per-line work of the real input path: parse + steering mapping."""
+    angle, acc, brk, btn_bits, hb_bit, gx, gy = parse_input_line(SAMPLE_LINE)
+    return steer_to_axis(angle, 0.5, 3, -450.0, 450.0)
+
+def input_loop(rate_hz: float, seconds: float, sink) -> None:
+    """
+    Wakes at a fixed rate like serial lines arriving and reports how late
+    each wake-up + input_tick() completed relative to its schedule.
+    """
+    period = 1.0 / rate_hz
+    n = int(seconds * rate_hz)
+    t0 = time.perf_counter() + 0.05
+    for k in range(n):
+        target = t0 + k * period
+        delay = target - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        input_tick()
+        sink(time.perf_counter() - target)
+
+def telemetry_load(stop: threading.Event) -> None:
+    """Pure-Python F1 packet decode + log formatting, like a busy main loop."""
+    motion = F1TelemetryReader.CAR_MOTION
+    telem = F1TelemetryReader.CAR_TELEM
+    buf_m = bytes(motion.size * 22)
+    buf_t = bytes(telem.size * 22)
+    log = io.StringIO()
+    while not stop.is_set():
+        for i in range(22):
+            m = motion.unpack_from(buf_m, i * motion.size)
+            t = telem.unpack_from(buf_t, i * telem.size)
+            log.write(f"[TEL] car={i} g={m[12]:.3f}/{m[13]:.3f} speed={t[0]} rpm={t[6]}\n")
+        if log.tell() > 1 << 20:
+            log.seek(0)
+            log.truncate()
+
+
+# =========================
+# Scenarios
+# =========================
+def run_single(rate_hz: float, seconds: float, load_threads: int) -> List[float]:
+    stop = threading.Event()
+    loads = [threading.Thread(target=telemetry_load, args=(stop,), daemon=True)
+             for _ in range(load_threads)]
+    for th in loads:
+        th.start()
+    samples: List[float] = []
+    inp = threading.Thread(target=input_loop, args=(rate_hz, seconds, samples.append))
+    inp.start()
+    inp.join()
+    stop.set()
+    for th in loads:
+        th.join()
+    return samples
+
+def _rt_child(ring_name: str, rate_hz: float, seconds: float, cpus, nice: int) -> None:
+    apply_rt_scheduling(cpus, nice)
+    ring = ShmRing.attach(ring_name, LATENESS_RECORD)
+    try:
+        input_loop(rate_hz, seconds, ring.push)
+    finally:
+        ring.close()
+
+def run_multi(rate_hz: float, seconds: float, load_threads: int, cpus, nice: int) -> List[float]:
+    ring = ShmRing.create(LATENESS_RECORD, capacity=int(rate_hz * seconds) + 16)
+    stop = threading.Event()
+    loads = [threading.Thread(target=telemetry_load, args=(stop,), daemon=True)
+             for _ in range(load_threads)]
+    for th in loads:
+        th.start()
+    samples: List[float] = []
+    ctx = mp.get_context("spawn")
+    proc = ctx.Process(target=_rt_child, args=(ring.name, rate_hz, seconds, cpus, nice))
+    proc.start()
+    # Consume like the main process does: drain the ring between load work
+    while proc.is_alive():
+        samples.extend(r[0] for r in ring.drain())
+        time.sleep(0.005)
+    proc.join()
+    samples.extend(r[0] for r in ring.drain())
+    stop.set()
+    for th in loads:
+        th.join()
+    ring.close()
+    return samples
+
+
+# =========================
+# Report
+# =========================
+def summarize(name: str, samples: List[float]) -> str:
+    if not samples:
+        return f"{name:<14} no samples"
+    s = sorted(samples)
+    def pct(p): return s[min(len(s) - 1, int(p * len(s)))] * 1e3
+    over = sum(1 for v in s if v > 1e-3)
+    return (f"{name:<14} n={len(s):<6} p50={pct(0.50):7.3f}ms p99={pct(0.99):7.3f}ms "
+            f"p99.9={pct(0.999):7.3f}ms max={s[-1] * 1e3:7.3f}ms >1ms={100.0 * over / len(s):5.1f}%")
+
+def main():
+    ap = argparse.ArgumentParser(description="Input-path jitter under synthetic load.")
+    ap.add_argument("--seconds", type=float, default=5.0)
+    ap.add_argument("--rate", type=float, default=500.0, help="input lines per second")
+    ap.add_argument("--load-threads", type=int, default=2)
+    ap.add_argument("--cpu", type=int, action="append", help="pin the input process (Linux)")
+    ap.add_argument("--nice", type=int, default=-10, help="niceness increment for the input process")
+    args = ap.parse_args()
+
+    print(f"rate={args.rate:.0f}Hz seconds={args.seconds} load_threads={args.load_threads} "
+          f"cpus={os.cpu_count()}", flush=True)
+    print(summarize("single-process", run_single(args.rate, args.seconds, args.load_threads)), flush=True)
+    print(summarize("multi-process", run_multi(args.rate, args.seconds, args.load_threads,
+                                               args.cpu, args.nice)), flush=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,303 @@
+# calibrate_shifter.py
+# Offline H-pattern shifter calibration.
+#
+# 1) Record labelled gx/gy samples. The tool prompts for each gear in turn:
+#    engage it, press Enter, then wiggle the lever inside the slot while it
+#    records for --seconds:
+#      python calibrate_shifter.py record --port COM16 --seconds 5 --out shifter_samples.csv
+# 2) Fit the six gear slots and write the lookup table:
+#      python calibrate_shifter.py build shifter_samples.csv --out gear_map.bin
+#
+# `build` also accepts unlabelled 'gx,gy' files or raw serial logs. It then
+# clusters them, drops the neutral cluster and trims transition samples,
+# but labelled recordings are more reliable.
+#
+# sim_race_pro_script.py loads GEAR_MAP_FILE at startup when it exists.
+# Needs NumPy (pip install numpy); the main script does not.
+
+from __future__ import annotations
+from typing import List, Optional, Tuple
+from gear_map import GEAR_SLOTS, SLOT_GEARS, GearMap
+from rt_input import parse_input_line
+import argparse
+import sys
+import time
+
+import numpy as np
+
+
+# =========================
+# Samples
+# =========================
+def read_samples(paths: List[str]) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Reads samples from text files. Each line may be 'gear,gx,gy' (as
+    written by `record`), 'gx,gy', or a raw Arduino input line.
+    Returns (points, gears) with gear 0 for unlabelled samples.
+    """
+    pts, gears = [], []
+    for path in paths:
+        with open(path, "r", encoding="utf-8", errors="ignore") as f:
+            for line in f:
+                line = line.strip()
+                if not line or line.startswith("#"):
+                    continue
+                if "," in line:
+                    try:
+                        vals = [int(float(v)) for v in line.split(",")]
+                    except ValueError:
+                        continue
+                    if len(vals) >= 3:
+                        gear, gx, gy = vals[:3]
+                    elif len(vals) == 2:
+                        gear, (gx, gy) = 0, vals
+                    else:
+                        continue
+                else:
+                    parsed = parse_input_line(line)
+                    if parsed is None:
+                        continue
+                    gear, gx, gy = 0, parsed[5], parsed[6]
+                pts.append((gx, gy))
+                gears.append(gear)
+    pts = np.clip(np.asarray(pts, dtype=np.float64).reshape(-1, 2), 0, 255)
+    return pts, np.asarray(gears, dtype=np.intp)
+
+def record_samples(port: str, baud: int, seconds: float, out: str) -> int:
+    """
+    Prompts for each gear in turn and logs 'gear,gx,gy' from the wheel
+    Arduino while the lever is held (and wiggled) inside that slot.
+    """
+    import serial
+
+    ser = serial.Serial(port, baud, timeout=0.1)
+    n = 0
+    try:
+        with open(out, "w", encoding="utf-8") as f:
+            f.write("# gear,gx,gy\n")
+            for gear, (row, col) in sorted(GEAR_SLOTS.items()):
+                input(f"[CAL] Engage gear {gear} ({row}/{col}), then press Enter and "
+                      f"wiggle the lever inside the slot for {seconds:.0f}s...")
+                ser.reset_input_buffer()
+                t_end = time.time() + seconds
+                while time.time() < t_end:
+                    raw = ser.readline().decode('utf-8', errors='ignore').strip()
+                    parsed = parse_input_line(raw) if raw else None
+                    if parsed is None:
+                        continue
+                    f.write(f"{gear},{parsed[5]},{parsed[6]}\n")
+                    n += 1
+    finally:
+        ser.close()
+    return n
+
+
+# =========================
+# Clustering
+# =========================
+def kmeans(pts: np.ndarray, k: int, restarts: int = 10, seed: int = 0) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    k-means with k-means++ seeding, keeping the best of `restarts` runs
+    (lowest within-cluster distance). Returns (centroids, labels).
+    """
+    rng = np.random.default_rng(seed)
+    best = None
+    for _ in range(restarts):
+        centroids, labels = _kmeans_once(pts, k, rng)
+        inertia = ((pts - centroids[labels]) ** 2).sum()
+        if best is None or inertia < best[0]:
+            best = (inertia, centroids, labels)
+    return best[1], best[2]
+
+def _kmeans_once(pts: np.ndarray, k: int, rng: np.random.Generator,
+                 iters: int = 100) -> Tuple[np.ndarray, np.ndarray]:
+    centroids = [pts[rng.integers(len(pts))]]
+    for _ in range(1, k):
+        d2 = np.min(((pts[:, None, :] - np.asarray(centroids)[None]) ** 2).sum(-1), axis=1)
+        if d2.sum() == 0:
+            raise ValueError("Not enough distinct samples to find all gear slots")
+        centroids.append(pts[rng.choice(len(pts), p=d2 / d2.sum())])
+    centroids = np.asarray(centroids)
+
+    labels = np.zeros(len(pts), dtype=np.intp)
+    for _ in range(iters):
+        labels = np.argmin(((pts[:, None, :] - centroids[None]) ** 2).sum(-1), axis=1)
+        new = np.array([pts[labels == j].mean(axis=0) if np.any(labels == j) else centroids[j]
+                        for j in range(k)])
+        if np.allclose(new, centroids):
+            break
+        centroids = new
+    return centroids, labels
+
+def drop_neutral(centroids: np.ndarray) -> Tuple[np.ndarray, Optional[int]]:
+    """
+    Picks the six gear slots out of seven clusters fitted to unlabelled
+    data. The cluster nearest the mean of all centroids is the neutral
+    dwell when it sits between the two rows; otherwise a slot was split
+    in two, and the closest pair is merged instead.
+    Returns (six centroids, index of the dropped neutral cluster or None).
+    """
+    mean = centroids.mean(axis=0)
+    cand = int(np.argmin(((centroids - mean) ** 2).sum(-1)))
+    others = np.delete(np.arange(len(centroids)), cand)
+    by_y = others[np.argsort(centroids[others, 1])]
+    up_y = centroids[by_y[:3], 1].mean()
+    down_y = centroids[by_y[3:], 1].mean()
+    lo, hi = min(up_y, down_y), max(up_y, down_y)
+    margin = 0.25 * (hi - lo)
+    if lo + margin < centroids[cand, 1] < hi - margin:
+        return centroids[others], cand
+
+    gap = ((centroids[:, None, :] - centroids[None]) ** 2).sum(-1)
+    np.fill_diagonal(gap, np.inf)
+    a, b = np.unravel_index(np.argmin(gap), gap.shape)
+    merged = (centroids[a] + centroids[b]) / 2.0
+    keep = [j for j in range(len(centroids)) if j not in (a, b)]
+    return np.vstack([centroids[keep], merged]), None
+
+def trim_slot(pts: np.ndarray, center: np.ndarray, min_radius: float,
+              iters: int = 3) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Re-centres a slot on its dense core, dropping samples further than
+    3x the median distance (lever travelling in or out of the slot).
+    Returns (center, core_points).
+    """
+    core = pts
+    for _ in range(iters):
+        d = np.sqrt(((pts - center) ** 2).sum(-1))
+        core = pts[d <= max(3.0 * np.median(d), min_radius)]
+        if len(core) == 0:
+            break
+        center = core.mean(axis=0)
+    return center, core
+
+def label_slots(centroids: np.ndarray, mirror_x: bool = False, mirror_y: bool = False) -> np.ndarray:
+    """
+    Maps the six clusters to gears by geometry, matching the threshold
+    convention of sim_race_pro_script.py: up = low gy, left = high gx.
+    """
+    gears = np.zeros(len(centroids), dtype=np.intp)
+    by_y = np.argsort(centroids[:, 1])
+    if mirror_y:
+        by_y = by_y[::-1]
+    for row, members in (("up", by_y[:3]), ("down", by_y[3:])):
+        by_x = members[np.argsort(centroids[members, 0])]
+        if mirror_x:
+            by_x = by_x[::-1]
+        for col, j in zip(("right", "center", "left"), by_x):
+            gears[j] = SLOT_GEARS[(row, col)]
+    return gears
+
+def build_gear_map(pts: np.ndarray, gears: Optional[np.ndarray] = None,
+                   hysteresis: float = 4.0, spread: float = 1.25,
+                   min_radius: float = 4.0, mirror_x: bool = False,
+                   mirror_y: bool = False) -> Tuple[GearMap, List[str]]:
+    """
+    Fits the six slots and rasterizes the 256x256 table.
+    - Labelled samples (gears 1..6) are grouped by gear directly.
+    - Unlabelled samples are clustered into seven groups, the neutral one
+      is dropped and the rest are labelled by geometry.
+    Each slot is then trimmed to its core (see trim_slot()):
+      - enter radius: `spread` x the 95th percentile core distance
+        (at least `min_radius`), capped so slots stay separated
+      - hold radius: enter radius + `hysteresis`, never past the midpoint
+        to the nearest other slot
+    Returns the map and a human-readable summary.
+    """
+    labelled = gears is not None and np.any(gears > 0)
+    if labelled:
+        missing = [g for g in GEAR_SLOTS if not np.any(gears == g)]
+        if missing:
+            raise ValueError(f"No samples recorded for gear(s) {missing}")
+        slot_gears = np.array(sorted(GEAR_SLOTS))
+        groups = [pts[gears == g] for g in slot_gears]
+    else:
+        if len(pts) < 7 * 10:
+            raise ValueError(f"Need at least 70 samples, got {len(pts)}")
+        centroids, labels = kmeans(pts, 7)
+        centroids, neutral = drop_neutral(centroids)
+        if neutral is not None:
+            pts = pts[labels != neutral]
+        slot_gears = label_slots(centroids, mirror_x, mirror_y)
+        nearest = np.argmin(((pts[:, None, :] - centroids[None]) ** 2).sum(-1), axis=1)
+        groups = [pts[nearest == j] for j in range(6)]
+
+    centroids = np.empty((6, 2))
+    spread_r = np.empty(6)
+    counts = np.empty(6, dtype=np.intp)
+    for j, group in enumerate(groups):
+        if len(group) < 10:
+            raise ValueError(f"Too few samples for gear {slot_gears[j]} ({len(group)})")
+        centroids[j], core = trim_slot(group, np.median(group, axis=0), min_radius)
+        d = np.sqrt(((core - centroids[j]) ** 2).sum(-1))
+        spread_r[j] = max(spread * np.percentile(d, 95), min_radius)
+        counts[j] = len(core)
+
+    gap = np.sqrt(((centroids[:, None, :] - centroids[None]) ** 2).sum(-1))
+    np.fill_diagonal(gap, np.inf)
+    half_gap = gap.min(axis=1) / 2.0
+
+    enter_r = np.minimum(spread_r, half_gap - hysteresis)
+    if np.any(enter_r <= 0):
+        raise ValueError("Gear slots are too close for this hysteresis; record again or lower it")
+    hold_r = np.minimum(enter_r + hysteresis, half_gap)
+
+    gx, gy = np.meshgrid(np.arange(256), np.arange(256), indexing="ij")
+    cells = np.stack([gx, gy], axis=-1).reshape(-1, 2).astype(np.float64)
+    dist = np.sqrt(((cells[:, None, :] - centroids[None]) ** 2).sum(-1))
+    nearest = np.argmin(dist, axis=1)
+    dn = dist[np.arange(len(cells)), nearest]
+    enter = np.where(dn <= enter_r[nearest], slot_gears[nearest], 0)
+    hold = np.where(dn <= hold_r[nearest], slot_gears[nearest], 0)
+    table = ((hold << 4) | enter).astype(np.uint8).tobytes()
+
+    summary = []
+    for j in np.argsort(slot_gears):
+        row, col = GEAR_SLOTS[int(slot_gears[j])]
+        summary.append(f"gear {slot_gears[j]} ({row}/{col}): center=({centroids[j, 0]:.1f}, {centroids[j, 1]:.1f}) "
+                       f"samples={counts[j]} enter_r={enter_r[j]:.1f} hold_r={hold_r[j]:.1f}")
+    return GearMap(table), summary
+
+
+# =========================
+# CLI
+# =========================
+def main():
+    ap = argparse.ArgumentParser(description="H-pattern shifter calibration.")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+
+    rec = sub.add_parser("record", help="record labelled gx/gy samples, one gear at a time")
+    rec.add_argument("--port", required=True)
+    rec.add_argument("--baud", type=int, default=115200)
+    rec.add_argument("--seconds", type=float, default=5.0, help="recording time per gear")
+    rec.add_argument("--out", default="shifter_samples.csv")
+
+    bld = sub.add_parser("build", help="fit the gear slots and write the gear map")
+    bld.add_argument("samples", nargs="+")
+    bld.add_argument("--out", default="gear_map.bin")
+    bld.add_argument("--hysteresis", type=float, default=4.0)
+    bld.add_argument("--spread", type=float, default=1.25)
+    bld.add_argument("--mirror-x", action="store_true", help="unlabelled data: left gears report low gx")
+    bld.add_argument("--mirror-y", action="store_true", help="unlabelled data: upper gears report high gy")
+    args = ap.parse_args()
+
+    if args.cmd == "record":
+        n = record_samples(args.port, args.baud, args.seconds, args.out)
+        print(f"[CAL] {n} samples written to {args.out}", flush=True)
+        return
+
+    pts, gears = read_samples(args.samples)
+    try:
+        gear_map, summary = build_gear_map(pts, gears, args.hysteresis, args.spread,
+                                           mirror_x=args.mirror_x, mirror_y=args.mirror_y)
+    except ValueError as e:
+        print(f"[ERROR] {e}", flush=True)
+        sys.exit(1)
+    for line in summary:
+        print(f"[CAL] {line}", flush=True)
+    gear_map.save(args.out)
+    print(f"[CAL] Gear map written to {args.out}", flush=True)
+
+
+if __name__ == "__main__":
+    main()
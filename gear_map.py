@@ -0,0 +1,108 @@
+# gear_map.py
+# Precomputed 256x256 H-pattern gear lookup table with hysteresis.
+# Built at startup from the threshold constants in sim_race_pro_script.py,
+# or loaded from a file produced by calibrate_shifter.py.
+
+from __future__ import annotations
+from typing import Dict, List, Optional, Sequence, Tuple
+
+# gear -> (row, column) slot on the H pattern
+GEAR_SLOTS: Dict[int, Tuple[str, str]] = {
+    1: ("up", "left"),   2: ("down", "left"),
+    3: ("up", "center"), 4: ("down", "center"),
+    5: ("up", "right"),  6: ("down", "right"),
+}
+SLOT_GEARS: Dict[Tuple[str, str], int] = {slot: gear for gear, slot in GEAR_SLOTS.items()}
+
+
+class GearMap:
+    """
+    One byte per (gx, gy) cell, indexed as (gx << 8) | gy:
+      - low nibble:  gear entered at this cell (0 = neutral)
+      - high nibble: gear kept at this cell if it is already engaged
+    The hold region of each slot is its enter region widened by the
+    hysteresis band, so a reading jittering on a slot edge does not
+    bounce between the gear and neutral. lookup() is two array reads.
+    """
+    SIZE = 256
+    MAGIC = b"SRPGEAR1"
+
+    def __init__(self, table: bytes):
+        if len(table) != self.SIZE * self.SIZE:
+            raise ValueError(f"Gear table must have {self.SIZE * self.SIZE} cells, got {len(table)}")
+        self.table = bytes(table)
+
+    def lookup(self, gx: int, gy: int, current: int = 0) -> int:
+        """Returns the gear for a 0..255 (gx, gy) sample given the engaged gear."""
+        v = self.table[(gx << 8) | gy]
+        if current and (v >> 4) == current:
+            return current
+        return v & 0x0F
+
+    # ---- persistence ----
+    @classmethod
+    def load(cls, path: str) -> "GearMap":
+        with open(path, "rb") as f:
+            data = f.read()
+        if not data.startswith(cls.MAGIC):
+            raise ValueError(f"{path} is not a gear map file")
+        return cls(data[len(cls.MAGIC):])
+
+    def save(self, path: str) -> None:
+        with open(path, "wb") as f:
+            f.write(self.MAGIC)
+            f.write(self.table)
+
+    # ---- builders ----
+    @classmethod
+    def from_thresholds(cls,
+                        y_up_max: int, y_down_min: int,
+                        x_right_max: int, x_center_min: int, x_center_max: int, x_left_min: int,
+                        hysteresis: int = 0) -> "GearMap":
+        """
+        Rebuilds the classic threshold logic as a table:
+          row:    up if gy <= y_up_max, down if gy >= y_down_min
+          column: right if gx <= x_right_max, center if x_center_min..x_center_max,
+                  left if gx >= x_left_min
+        Everything else is neutral. Hold bands extend each band by `hysteresis`
+        into the neighbouring gap (never past its midpoint).
+        """
+        rows = [("up", 0, y_up_max), ("down", y_down_min, cls.SIZE - 1)]
+        cols = [("right", 0, x_right_max), ("center", x_center_min, x_center_max),
+                ("left", x_left_min, cls.SIZE - 1)]
+        row_enter, row_hold = _axis_bands(rows, hysteresis, cls.SIZE)
+        col_enter, col_hold = _axis_bands(cols, hysteresis, cls.SIZE)
+
+        table = bytearray(cls.SIZE * cls.SIZE)
+        for gx in range(cls.SIZE):
+            ce, ch = col_enter[gx], col_hold[gx]
+            base = gx << 8
+            for gy in range(cls.SIZE):
+                enter = SLOT_GEARS.get((row_enter[gy], ce), 0)
+                hold = SLOT_GEARS.get((row_hold[gy], ch), 0)
+                table[base | gy] = (hold << 4) | enter
+        return cls(bytes(table))
+
+
+def _axis_bands(bands: Sequence[Tuple[str, int, int]], hysteresis: int,
+                size: int) -> Tuple[List[Optional[str]], List[Optional[str]]]:
+    """
+    Per-axis value -> band name for the enter and hold regions.
+    A value in a gap holds the nearest band within `hysteresis`; values
+    equidistant from two bands hold neither.
+    """
+    enter: List[Optional[str]] = [None] * size
+    hold: List[Optional[str]] = [None] * size
+    for v in range(size):
+        best, best_d, tie = None, None, False
+        for name, lo, hi in bands:
+            d = lo - v if v < lo else v - hi if v > hi else 0
+            if d == 0:
+                enter[v] = name
+            if best_d is None or d < best_d:
+                best, best_d, tie = name, d, False
+            elif d == best_d:
+                tie = True
+        if best_d is not None and best_d <= hysteresis and not tie:
+            hold[v] = best
+    return enter, hold
@@ -0,0 +1,262 @@
+# rt_input.py
+# Lean real-time input process: serial input -> virtual gamepad.
+# Spawned by sim_race_pro_script.py when MULTIPROCESS_ENABLED = True, so that
+# telemetry decode, effects and logging (which stay in the main process) no
+# longer compete with steering for the GIL. The two processes exchange
+# fixed-layout records through ShmRing (multiprocessing.shared_memory).
+
+from __future__ import annotations
+from typing import Iterable, List, Optional, Tuple
+from shm_ring import ShmRing
+import json
+import os
+import re
+import struct
+import sys
+import threading
+import time
+
+# =========================
+# Shared record layouts
+# =========================
+# Input process -> main process, one record per parsed serial line:
+# t (perf_counter), angle, throttle, brake, gx, gy, handbrake bit, button bitmask, raw line
+INPUT_RECORD = struct.Struct("<dfBBhhBH96s")
+
+# Main process -> input process: one encoded telemetry line (NUL padded)
+TX_RECORD = struct.Struct("<128s")
+
+INPUT_PATTERN = re.compile(r'^\s*([+-]?\d+(?:\.\d+)?)\-(\d+)\-(\d+)\-(.*)\s*$')
+
+
+def _log(msg): print(msg, flush=True)
+
+def clamp(v, lo, hi): return lo if v < lo else hi if v > hi else v
+
+def parse_input_line(raw: str) -> Optional[Tuple[float, int, int, List[int], int, int, int]]:
+    """
+    Parses one Arduino input line:
+        angle-throttle-brake-<button bits...>-handbrake-gx-gy
+    Returns (angle, throttle, brake, btn_bits, hb_bit, gx, gy) or None if malformed.
+    """
+    m = INPUT_PATTERN.match(raw)
+    if not m:
+        return None
+
+    try:
+        angle = float(m.group(1))
+        acc = int(m.group(2))
+        brk = int(m.group(3))
+    except ValueError:
+        return None
+
+    tparts = m.group(4).split('-')
+    if len(tparts) < 2:
+        return None
+
+    try:
+        gx = int(tparts[-2])
+        gy = int(tparts[-1])
+    except ValueError:
+        gx = gy = 0
+
+    mid = tparts[:-2]
+    btn_bits = []
+    hb_bit = 0
+    if mid:
+        tmp = []
+        for p in mid:
+            try:
+                tmp.append(int(p))
+            except ValueError:
+                tmp.append(0)
+        hb_bit = tmp[-1] if tmp else 0
+        btn_bits = tmp[:-1]
+
+    return angle, acc, brk, btn_bits, hb_bit, gx, gy
+
+def steer_to_axis(angle: float, deadzone: float, gain: float,
+                  angle_min: float, angle_max: float) -> int:
+    """Maps a wheel angle (degrees) to the left-stick X value (-32768..32767)."""
+    ax_raw = 0.0 if abs(angle) < deadzone else angle
+    ax = clamp(ax_raw * gain, angle_min, angle_max)
+    norm = (ax - angle_min) / (angle_max - angle_min)
+    return clamp(int(norm * 65535) - 32768, -32768, 32767)
+
+def button_mask(btn_bits: Iterable[int]) -> int:
+    """Packs the per-button 0/1 states into a 16-bit mask."""
+    mask = 0
+    for idx, state in enumerate(btn_bits):
+        if state == 1 and idx < 16:
+            mask |= 1 << idx
+    return mask
+
+def apply_rt_scheduling(cpus: Optional[Iterable[int]] = None,
+                        nice: int = 0,
+                        fifo_priority: int = 0) -> None:
+    """
+    Best-effort tuning of the calling process for low input latency:
+      - cpus: pin to these CPU ids (os.sched_setaffinity, Linux)
+      - nice: niceness increment, negative raises priority (needs CAP_SYS_NICE)
+      - fifo_priority: >0 switches to SCHED_FIFO at this priority (Linux)
+    Failures are logged and ignored; the process still runs untuned.
+    """
+    if cpus:
+        if hasattr(os, "sched_setaffinity"):
+            try:
+                os.sched_setaffinity(0, set(cpus))
+                _log(f"[RT] CPU affinity set to {sorted(set(cpus))}.")
+            except OSError as e:
+                _log(f"[RT] Could not set CPU affinity: {e}")
+        else:
+            _log("[RT] CPU affinity not supported on this platform.")
+
+    if fifo_priority > 0:
+        if hasattr(os, "sched_setscheduler"):
+            try:
+                os.sched_setscheduler(0, os.SCHED_FIFO, os.sched_param(fifo_priority))
+                _log(f"[RT] SCHED_FIFO priority {fifo_priority}.")
+                return
+            except OSError as e:
+                _log(f"[RT] Could not set SCHED_FIFO: {e}")
+        else:
+            _log("[RT] SCHED_FIFO not supported on this platform.")
+
+    if nice:
+        if hasattr(os, "nice"):
+            try:
+                os.nice(nice)
+                _log(f"[RT] Niceness adjusted by {nice}.")
+            except OSError as e:
+                _log(f"[RT] Could not adjust niceness: {e}")
+        else:
+            _log("[RT] Niceness not supported on this platform.")
+
+
+def watch_parent_pipe(gone: threading.Event) -> None:
+    """
+    Blocks on stdin, a pipe held open by the main process, and sets `gone`
+    on EOF or error. Unlike comparing os.getppid(), this still works when
+    sys.executable is a launcher that re-spawns the real interpreter
+    (Windows venvs, Store Python).
+    """
+    try:
+        while sys.stdin.buffer.read(1):
+            pass
+    except (OSError, ValueError, AttributeError):
+        pass
+    gone.set()
+
+
+# =========================
+# Input process main loop
+# =========================
+def run(cfg: dict) -> None:
+    """
+    Owns the serial port and the virtual gamepad:
+      - serial lines are parsed and applied to the gamepad immediately
+      - every parsed line is forwarded to the main process via the input ring
+      - telemetry lines queued by the main process are written back to serial
+    Exits when the main process closes the rings or goes away.
+    """
+    import serial
+    import vgamepad as vg
+
+    apply_rt_scheduling(cfg.get("cpu_affinity"), cfg.get("nice", 0), cfg.get("fifo_priority", 0))
+
+    in_ring = ShmRing.attach(cfg["input_ring"], INPUT_RECORD)
+    tx_ring = ShmRing.attach(cfg["tx_ring"], TX_RECORD)
+
+    try:
+        gamepad = vg.VX360Gamepad()
+        gamepad.update()
+        _log("[RT] Virtual gamepad ready.")
+    except Exception as e:
+        _log(f"[ERROR] Could not create virtual gamepad: {e}")
+        sys.exit(1)
+
+    try:
+        # Short timeout so the telemetry ring is serviced between input lines
+        ser = serial.Serial(cfg["port"], cfg["baud"], timeout=0.005)
+        _log(f"[RT] Serial open on {cfg['port']} @ {cfg['baud']}.")
+    except Exception as e:
+        _log(f"[ERROR] Unable to open serial port: {e}")
+        sys.exit(1)
+
+    buttons = {int(k): vg.XUSB_BUTTON(v) for k, v in cfg["buttons"].items()}
+    steer = (cfg["angle_deadzone"], cfg["steer_gain"], cfg["angle_min"], cfg["angle_max"])
+    hold_s = cfg.get("button_hold_s", 0.08)
+    parent_gone = threading.Event()
+    threading.Thread(target=watch_parent_pipe, args=(parent_gone,), daemon=True).start()
+
+    pending = b""
+    held = []
+    release_at = 0.0
+    dropped = 0
+    next_check = 0.0
+
+    try:
+        while not tx_ring.closed:
+            chunk = ser.read(ser.in_waiting or 1)
+            if chunk:
+                pending += chunk
+                *lines, pending = pending.split(b"\n")
+                if len(pending) > 1024:
+                    pending = b""
+                for line in lines:
+                    raw = line.decode('utf-8', errors='ignore').strip()
+                    if not raw:
+                        continue
+                    parsed = parse_input_line(raw)
+                    if parsed is None:
+                        continue
+                    angle, acc, brk, btn_bits, hb_bit, gx, gy = parsed
+                    now = time.perf_counter()
+
+                    gamepad.left_joystick(x_value=steer_to_axis(angle, *steer), y_value=0)
+                    gamepad.right_trigger(value=clamp(acc, 0, 255))
+                    gamepad.left_trigger(value=clamp(brk, 0, 255))
+                    if not held:
+                        held = [buttons[i] for i, s in enumerate(btn_bits) if s == 1 and i in buttons]
+                        for btn in held:
+                            gamepad.press_button(button=btn)
+                        release_at = now + hold_s
+                    gamepad.update()
+
+                    if not in_ring.push(now, angle, clamp(acc, 0, 255), clamp(brk, 0, 255),
+                                        clamp(gx, -32768, 32767), clamp(gy, -32768, 32767),
+                                        1 if hb_bit == 1 else 0, button_mask(btn_bits),
+                                        raw.encode('utf-8')):
+                        dropped += 1
+
+            now = time.perf_counter()
+            # Non-blocking button release: never sleep on the input path
+            if held and now >= release_at:
+                for btn in held:
+                    gamepad.release_button(button=btn)
+                gamepad.update()
+                held = []
+
+            for (data,) in tx_ring.drain():
+                ser.write(data.rstrip(b"\0"))
+
+            if now >= next_check:
+                next_check = now + 1.0
+                if parent_gone.is_set():
+                    _log("[RT] Main process gone; exiting.")
+                    break
+                if dropped:
+                    _log(f"[RT] Input ring full, dropped {dropped} record(s).")
+                    dropped = 0
+    except KeyboardInterrupt:
+        pass
+    finally:
+        try:
+            ser.close()
+        finally:
+            in_ring.close()
+            tx_ring.close()
+
+
+if __name__ == "__main__":
+    run(json.loads(sys.argv[1]))
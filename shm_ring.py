@@ -0,0 +1,137 @@
+# shm_ring.py
+# Single-producer / single-consumer ring buffer of fixed-layout records
+# living in multiprocessing.shared_memory, used to hand data between the
+# real-time input process and the telemetry / logging process.
+
+from __future__ import annotations
+from multiprocessing import shared_memory
+from typing import List, Optional, Tuple
+import multiprocessing
+import struct
+import sys
+
+
+class ShmRing:
+    """
+    Lock-free SPSC ring of `record`-shaped slots.
+
+    Layout: [head u64][tail u64][capacity u32][record_size u32][closed u8][pad]
+    followed by `capacity` slots of `record.size` bytes.
+    - head/tail are monotonically increasing counters; slot = counter % capacity.
+    - Only the producer writes head, only the consumer writes tail, so no lock
+      is needed. A slot is written before head is published.
+    - push() never blocks: when the ring is full the new record is dropped
+      and False is returned, so the producer keeps its timing.
+    """
+    HEADER = struct.Struct("<QQIIB7x")
+    _U64 = struct.Struct("<Q")
+    _HEAD_OFF = 0
+    _TAIL_OFF = 8
+    _CLOSED_OFF = 24
+
+    def __init__(self, shm: shared_memory.SharedMemory, record: struct.Struct, owner: bool):
+        self.shm = shm
+        self.record = record
+        self.owner = owner
+        _, _, self.capacity, record_size, _ = self.HEADER.unpack_from(shm.buf, 0)
+        if record_size != record.size:
+            raise ValueError(f"Record size mismatch on ring '{shm.name}': "
+                             f"{record_size} != {record.size}")
+        self._buf = shm.buf
+
+    @property
+    def name(self) -> str:
+        return self.shm.name
+
+    @classmethod
+    def create(cls, record: struct.Struct, capacity: int = 256,
+               name: Optional[str] = None) -> "ShmRing":
+        if capacity <= 0:
+            raise ValueError("capacity must be positive")
+        size = cls.HEADER.size + capacity * record.size
+        shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        cls.HEADER.pack_into(shm.buf, 0, 0, 0, capacity, record.size, 0)
+        return cls(shm, record, owner=True)
+
+    @classmethod
+    def attach(cls, name: str, record: struct.Struct) -> "ShmRing":
+        shm = _attach_untracked(name)
+        return cls(shm, record, owner=False)
+
+    # ---- counters ----
+    def _get(self, off: int) -> int:
+        return self._U64.unpack_from(self._buf, off)[0]
+
+    def _set(self, off: int, value: int) -> None:
+        self._U64.pack_into(self._buf, off, value)
+
+    def __len__(self) -> int:
+        return self._get(self._HEAD_OFF) - self._get(self._TAIL_OFF)
+
+    # ---- producer side ----
+    def push(self, *values) -> bool:
+        head = self._get(self._HEAD_OFF)
+        if head - self._get(self._TAIL_OFF) >= self.capacity:
+            return False
+        off = self.HEADER.size + (head % self.capacity) * self.record.size
+        self.record.pack_into(self._buf, off, *values)
+        self._set(self._HEAD_OFF, head + 1)
+        return True
+
+    # ---- consumer side ----
+    def pop(self) -> Optional[Tuple]:
+        tail = self._get(self._TAIL_OFF)
+        if tail == self._get(self._HEAD_OFF):
+            return None
+        off = self.HEADER.size + (tail % self.capacity) * self.record.size
+        rec = self.record.unpack_from(self._buf, off)
+        self._set(self._TAIL_OFF, tail + 1)
+        return rec
+
+    def drain(self) -> List[Tuple]:
+        """Pops every record currently available, oldest first."""
+        tail = self._get(self._TAIL_OFF)
+        head = self._get(self._HEAD_OFF)
+        out = []
+        while tail < head:
+            off = self.HEADER.size + (tail % self.capacity) * self.record.size
+            out.append(self.record.unpack_from(self._buf, off))
+            tail += 1
+        self._set(self._TAIL_OFF, tail)
+        return out
+
+    # ---- lifecycle ----
+    @property
+    def closed(self) -> bool:
+        return self._buf[self._CLOSED_OFF] != 0
+
+    def mark_closed(self) -> None:
+        """Signals the peer process that this ring is shutting down."""
+        self._buf[self._CLOSED_OFF] = 1
+
+    def close(self) -> None:
+        if self.shm is None:
+            return
+        self._buf = None
+        try:
+            self.shm.close()
+            if self.owner:
+                self.shm.unlink()
+        finally:
+            self.shm = None
+
+
+def _attach_untracked(name: str) -> shared_memory.SharedMemory:
+    """
+    Attaches to an existing segment without letting this process' resource
+    tracker unlink it on exit (POSIX, Python < 3.13). The creator owns it.
+    Children started by multiprocessing share the creator's tracker, so
+    they must leave its registration alone.
+    """
+    if sys.version_info >= (3, 13):
+        return shared_memory.SharedMemory(name=name, track=False)
+    shm = shared_memory.SharedMemory(name=name)
+    if sys.platform != "win32" and multiprocessing.parent_process() is None:
+        from multiprocessing import resource_tracker
+        resource_tracker.unregister(shm._name, "shared_memory")
+    return shm
@@ -1,8 +1,11 @@
-import serial, threading, time, re, sys
+import serial, threading, time, sys, os, json, subprocess
 import vgamepad as vg
 from dataclasses import dataclass
 from typing import Optional
 from telemetry_sources import TelemetryFrame, F1TelemetryReader, ACCTelemetryReader
+from shm_ring import ShmRing
+from rt_input import INPUT_RECORD, TX_RECORD, parse_input_line, steer_to_axis
+from gear_map import GEAR_SLOTS, GearMap
 
 VERSION = "1.4.0"
 print(f"SIM RACE BOX ver. {VERSION}", flush=True)
@@ -29,16 +32,24 @@ KEYBOARD_SIM_ENABLED = True
 
 SELECTED_GAME = "F1"   # or "ACC"
 
-# Manual transmission thresholds (0..255)
+# Multi-process mode: a lean child process (rt_input.py) owns the
+# serial input -> gamepad path; this process keeps telemetry, effects and logs
+MULTIPROCESS_ENABLED = False
+RT_CPU_AFFINITY = None         # e.g. [1] to pin the input process to CPU 1 (Linux)
+RT_NICE = -10                  # Niceness increment for the input process (Linux, needs CAP_SYS_NICE)
+RT_FIFO_PRIORITY = 0           # >0 requests SCHED_FIFO at this priority instead (Linux)
+
+# Manual transmission thresholds (0..255), used when no calibrated map exists
 GEAR_Y_MAP = {
     "up_max": 125,
     "down_min": 140
 }
-INVERT_GX = True
 X_RIGHT_MAX = 104
 X_CENTER_MIN = 110
 X_CENTER_MAX = 132
 X_LEFT_MIN = 138
+GEAR_HYSTERESIS = 4            # Extra margin (0..255 units) before leaving an engaged gear
+GEAR_MAP_FILE = "gear_map.bin" # Written by calibrate_shifter.py; loaded at startup if present
 
 # Keyboard
 try:
@@ -64,7 +75,8 @@ def create_gamepad():
         _log(f"[ERROR] Could not create virtual gamepad: {e}")
         sys.exit(1)
 
-create_gamepad()
+if not MULTIPROCESS_ENABLED:
+    create_gamepad()
 
 # Button mapping (kept from your version)
 button_map = {
@@ -87,12 +99,15 @@ button_map = {
 # =========================================================
 # Serial initialization
 # =========================================================
-try:
-    ser = serial.Serial(SERIAL_PORT, BAUD_RATE, timeout=1)
-    _log(f"[INFO] Serial open on {SERIAL_PORT} @ {BAUD_RATE}.")
-except Exception as e:
-    print(f"[ERROR] Unable to open serial port: {e}", flush=True)
-    sys.exit(1)
+# In multi-process mode the port is opened by the input process instead.
+ser = None
+if not MULTIPROCESS_ENABLED:
+    try:
+        ser = serial.Serial(SERIAL_PORT, BAUD_RATE, timeout=1)
+        _log(f"[INFO] Serial open on {SERIAL_PORT} @ {BAUD_RATE}.")
+    except Exception as e:
+        print(f"[ERROR] Unable to open serial port: {e}", flush=True)
+        sys.exit(1)
 
 # =========================================================
 # Shared state
@@ -103,6 +118,7 @@ last_angle = 0.0
 last_hb_bit = 0
 last_gear_idx = 0
 gear_key_map = {1:'1', 2:'2', 3:'3', 4:'4', 5:'5', 6:'6'}
+gear_map: Optional[GearMap] = None
 
 # =========================================================
 # Helper functions
@@ -116,11 +132,7 @@ def update_gamepad(throttle=None, brake=None, steer_angle=None):
 
     # Steering axis
     if steer_angle is not None:
-        ax_raw = 0.0 if abs(steer_angle) < ANGLE_DEADZONE_DEG else steer_angle
-        ax = clamp(ax_raw * STEER_GAIN, ANGLE_MIN, ANGLE_MAX)
-        norm = (ax - ANGLE_MIN) / (ANGLE_MAX - ANGLE_MIN)
-        x_val = int(norm * 65535) - 32768
-        x_val = clamp(x_val, -32768, 32767)
+        x_val = steer_to_axis(steer_angle, ANGLE_DEADZONE_DEG, STEER_GAIN, ANGLE_MIN, ANGLE_MAX)
         gamepad.left_joystick(x_value=x_val, y_value=0)
         gamepad.update()
 
@@ -168,51 +180,45 @@ def handle_handbrake(hb_bit):
         kb_press('space')
     last_hb_bit = hb_bit
 
-def gear_from_gx_gy(gx, gy):
+def load_gear_map() -> GearMap:
+    """
+    Loads the calibrated shifter table (GEAR_MAP_FILE) if present,
+    otherwise builds one from the threshold constants above.
+    """
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), GEAR_MAP_FILE)
+    if os.path.exists(path):
+        try:
+            gm = GearMap.load(path)
+            _log(f"[GEAR] Calibrated gear map loaded from {GEAR_MAP_FILE}.")
+            return gm
+        except Exception as e:
+            _log(f"[GEAR] Could not load {GEAR_MAP_FILE}, using thresholds: {e}")
+    return GearMap.from_thresholds(
+        GEAR_Y_MAP["up_max"], GEAR_Y_MAP["down_min"],
+        X_RIGHT_MAX, X_CENTER_MIN, X_CENTER_MAX, X_LEFT_MIN,
+        hysteresis=GEAR_HYSTERESIS,
+    )
+
+def gear_from_gx_gy(gx, gy, current=0):
     """
     Determines the current gear position from gyroscope / accelerometer
-    values (gx, gy). Used for H-pattern shifter logic.
+    values (gx, gy, clamped to 0..255) through the precomputed gear map.
+    Used for H-pattern shifter logic. `current` is the engaged gear, which
+    is kept while the sample stays inside its hysteresis band.
     Returns (gear_index, row, column):
       - gear_index: int (0 for neutral)
       - row: "up" | "down" | "mid"
       - column: "left" | "center" | "right" | "mid"
     """
-    if not MANUAL_TX_ENABLED:
+    if not MANUAL_TX_ENABLED or gear_map is None:
         return 0, "off", "off"
 
-    # Determine shift row
-    if gy <= GEAR_Y_MAP["up_max"]:
-        row = "up"
-    elif gy >= GEAR_Y_MAP["down_min"]:
-        row = "down"
-    else:
-        return 0, "mid", "mid"
-
-    # Determine column depending on inversion
-    if INVERT_GX:
-        if gx <= X_RIGHT_MAX:
-            col = "right"
-        elif X_CENTER_MIN <= gx <= X_CENTER_MAX:
-            col = "center"
-        elif gx >= X_LEFT_MIN:
-            col = "left"
-        else:
-            return 0, row, "mid"
-    else:
-        if gx >= X_LEFT_MIN:
-            col = "left"
-        elif X_CENTER_MIN <= gx <= X_CENTER_MAX:
-            col = "center"
-        elif gx <= X_RIGHT_MAX:
-            col = "right"
-        else:
-            return 0, row, "mid"
+    gear = gear_map.lookup(gx, gy, current)
+    row, col = GEAR_SLOTS.get(gear, ("mid", "mid"))
+    return gear, row, col
 
-    # Determine gear number based on position grid
-    if col == "left":   return (1 if row == "up" else 2), row, col
-    if col == "center": return (3 if row == "up" else 4), row, col
-    if col == "right":  return (5 if row == "up" else 6), row, col
-    return 0, row, col
+if MANUAL_TX_ENABLED:
+    gear_map = load_gear_map()
 
 
 _last_raw_print = 0.0
@@ -306,13 +312,39 @@ def send_telemetry(ser_obj: serial.Serial, pkt: TelemetryPacket):
     except Exception as e:
         _log(f"[WARN] send_telemetry error: {e}")
 
+def queue_telemetry(ring: ShmRing, pkt: TelemetryPacket):
+    """Hands the encoded telemetry line to the input process, which owns the port."""
+    try:
+        line = build_serial_line(pkt)
+        if not ring.push(line.encode("ascii")):
+            _log("[WARN] Telemetry ring full, packet dropped.")
+    except Exception as e:
+        _log(f"[WARN] queue_telemetry error: {e}")
+
 # =========================================================
-# Serial reader (unchanged)
+# Input handling
 # =========================================================
+def handle_shifter_and_handbrake(gx, gy, hb_bit):
+    """Handbrake and H-pattern gear keys, shared by both input paths."""
+    global last_gear_idx
+    maybe_log_raw_gxy(gx, gy)
+
+    if HANDBRAKE_ENABLED:
+        handle_handbrake(1 if hb_bit == 1 else 0)
+
+    if MANUAL_TX_ENABLED:
+        gear_idx, row, col = gear_from_gx_gy(clamp(gx,0,255), clamp(gy,0,255), last_gear_idx)
+        if gear_idx != last_gear_idx:
+            if gear_idx in gear_key_map:
+                kb_press(gear_key_map[gear_idx])
+                _log(f"[GEAR] {gear_idx} (row={row}, col={col})")
+            elif gear_idx == 0 and last_gear_idx != 0:
+                _log(f"[GEAR] Neutral (row={row}, col={col})")
+            last_gear_idx = gear_idx
+
 def serial_reader():
-    global last_throttle_val, last_brake_val, last_angle, last_gear_idx
+    global last_throttle_val, last_brake_val, last_angle
     _log("[INFO] Serial reader active.")
-    pattern = re.compile(r'^\s*([+-]?\d+(?:\.\d+)?)\-(\d+)\-(\d+)\-(.*)\s*$')
 
     while True:
         try:
@@ -322,45 +354,14 @@ def serial_reader():
             if DEBUG_SERIAL_LOGS:
                 _log(f"[SERIAL] {raw}")
 
-            m = pattern.match(raw)
-            if not m:
+            parsed = parse_input_line(raw)
+            if parsed is None:
                 continue
-
-            try:
-                angle = float(m.group(1))
-                acc = int(m.group(2))
-                brk = int(m.group(3))
-            except ValueError:
-                continue
-
-            tail = m.group(4)
-            tparts = tail.split('-')
-            if len(tparts) < 2:
-                continue
-
-            try:
-                gx = int(tparts[-2])
-                gy = int(tparts[-1])
-            except ValueError:
-                gx = gy = 0
-
-            mid = tparts[:-2]
-            btn_bits = []
-            hb_bit = 0
-            if mid:
-                tmp = []
-                for p in mid:
-                    try:
-                        tmp.append(int(p))
-                    except:
-                        tmp.append(0)
-                hb_bit = tmp[-1] if tmp else 0
-                btn_bits = tmp[:-1]
+            angle, acc, brk, btn_bits, hb_bit, gx, gy = parsed
 
             last_angle = angle
             last_throttle_val = clamp(acc, 0, 255)
             last_brake_val = clamp(brk, 0, 255)
-            maybe_log_raw_gxy(gx, gy)
 
             to_press = []
             for idx, state in enumerate(btn_bits):
@@ -369,28 +370,104 @@ def serial_reader():
             if to_press:
                 press_instant_buttons(to_press)
 
-            if HANDBRAKE_ENABLED:
-                handle_handbrake(1 if hb_bit == 1 else 0)
-
-            if MANUAL_TX_ENABLED:
-                gear_idx, row, col = gear_from_gx_gy(clamp(gx,0,255), clamp(gy,0,255))
-                if gear_idx != last_gear_idx:
-                    if gear_idx in gear_key_map:
-                        kb_press(gear_key_map[gear_idx])
-                        _log(f"[GEAR] {gear_idx} (row={row}, col={col})")
-                    elif gear_idx == 0 and last_gear_idx != 0:
-                        _log(f"[GEAR] Neutral (row={row}, col={col})")
-                    last_gear_idx = gear_idx
+            handle_shifter_and_handbrake(gx, gy, hb_bit)
 
         except Exception as e:
             _log(f"[WARN] Reader error: {e}")
             time.sleep(0.01)
 
+# =========================================================
+# Multi-process mode (input process <-> shared memory rings)
+# =========================================================
+input_ring: Optional[ShmRing] = None
+tx_ring: Optional[ShmRing] = None
+rt_proc: Optional[subprocess.Popen] = None
+rt_consumer: Optional[threading.Thread] = None
+rt_consumer_stop = threading.Event()
+
+def start_rt_process():
+    """Creates the shared memory rings, spawns rt_input.py and starts the consumer."""
+    global input_ring, tx_ring, rt_proc, rt_consumer
+    input_ring = ShmRing.create(INPUT_RECORD, capacity=1024)
+    tx_ring = ShmRing.create(TX_RECORD, capacity=64)
+    cfg = {
+        "port": SERIAL_PORT,
+        "baud": BAUD_RATE,
+        "input_ring": input_ring.name,
+        "tx_ring": tx_ring.name,
+        "angle_min": ANGLE_MIN,
+        "angle_max": ANGLE_MAX,
+        "angle_deadzone": ANGLE_DEADZONE_DEG,
+        "steer_gain": STEER_GAIN,
+        "buttons": {str(idx): int(btn) for idx, btn in button_map.items()},
+        "cpu_affinity": RT_CPU_AFFINITY,
+        "nice": RT_NICE,
+        "fifo_priority": RT_FIFO_PRIORITY,
+    }
+    script = os.path.join(os.path.dirname(os.path.abspath(__file__)), "rt_input.py")
+    # stdin stays open for the child's lifetime; EOF tells it we are gone
+    rt_proc = subprocess.Popen([sys.executable, "-u", script, json.dumps(cfg)],
+                               stdin=subprocess.PIPE)
+    _log(f"[RT] Input process started (pid {rt_proc.pid}).")
+    rt_consumer = threading.Thread(target=rt_input_consumer, daemon=True)
+    rt_consumer.start()
+
+def stop_rt_process():
+    """Stops the consumer and the input process, then releases the rings."""
+    global rt_proc, rt_consumer
+    # The consumer must be out of input_ring before the buffers are freed
+    rt_consumer_stop.set()
+    if rt_consumer is not None:
+        rt_consumer.join()
+        rt_consumer = None
+    if tx_ring is not None:
+        tx_ring.mark_closed()
+    if rt_proc is not None:
+        try:
+            rt_proc.stdin.close()
+        except OSError:
+            pass
+        try:
+            rt_proc.wait(timeout=1.0)
+        except subprocess.TimeoutExpired:
+            rt_proc.terminate()
+            rt_proc.wait(timeout=1.0)
+        rt_proc = None
+    for ring in (input_ring, tx_ring):
+        if ring is not None:
+            ring.close()
+
+def rt_input_consumer():
+    """Mirrors input records from the input process into the shared state."""
+    global last_throttle_val, last_brake_val, last_angle
+    _log("[INFO] Input ring consumer active.")
+
+    while not rt_consumer_stop.is_set():
+        try:
+            records = input_ring.drain()
+            if not records:
+                time.sleep(0.005)
+                continue
+            for (_t, angle, acc, brk, gx, gy, hb_bit, _buttons, raw) in records:
+                if DEBUG_SERIAL_LOGS:
+                    line = raw.rstrip(b"\0").decode('utf-8', errors='ignore')
+                    _log(f"[SERIAL] {line}")
+                last_angle = angle
+                last_throttle_val = acc
+                last_brake_val = brk
+                handle_shifter_and_handbrake(gx, gy, hb_bit)
+        except Exception as e:
+            _log(f"[WARN] Input consumer error: {e}")
+            time.sleep(0.01)
+
 # ---------------------------------------------------------
-# Start the serial reader thread (Arduino -> PC inputs)
+# Start the input path (Arduino -> PC inputs)
 # ---------------------------------------------------------
-t = threading.Thread(target=serial_reader, daemon=True)
-t.start()
+if MULTIPROCESS_ENABLED:
+    start_rt_process()
+else:
+    t = threading.Thread(target=serial_reader, daemon=True)
+    t.start()
 
 # ---------------------------------------------------------
 # External game telemetry selection
@@ -424,12 +501,18 @@ try:
     while True:
         time.sleep(0.01)
 
-        # Update virtual gamepad from Arduino input
-        update_gamepad(
-            throttle=last_throttle_val,
-            brake=last_brake_val,
-            steer_angle=last_angle
-        )
+        if MULTIPROCESS_ENABLED:
+            # The input process drives the gamepad; just watch it stays alive
+            if rt_proc.poll() is not None:
+                _log(f"[RT] Input process exited (code {rt_proc.returncode}).")
+                break
+        else:
+            # Update virtual gamepad from Arduino input
+            update_gamepad(
+                throttle=last_throttle_val,
+                brake=last_brake_val,
+                steer_angle=last_angle
+            )
 
         # Periodic telemetry send to Arduino (PC -> Arduino)
         if SEND_TELEMETRY:
@@ -465,7 +548,10 @@ try:
                     })
 
                 # Send the unified packet out to Arduino
-                send_telemetry(ser, pkt)
+                if MULTIPROCESS_ENABLED:
+                    queue_telemetry(tx_ring, pkt)
+                else:
+                    send_telemetry(ser, pkt)
 
 except KeyboardInterrupt:
     print("\n[EXIT] User interrupted.", flush=True)
@@ -477,3 +563,6 @@ finally:
             _log("[TEL] Reader closed.")
     except Exception as e:
         _log(f"[TEL] Close error: {e}")
+    if MULTIPROCESS_ENABLED:
+        stop_rt_process()
+        _log("[RT] Input process stopped.")